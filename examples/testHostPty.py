@@ -0,0 +1,28 @@
+# Runs the RTU client against the RTU server on a Linux host over a pseudo terminal.
+import _thread
+import time
+from uModBusSerial import uModBusSerial
+from uModBusSerialServer import uModBusSerialServer
+from uModBusServer import uModBusSequentialDataBank
+from uModBusTransport import uModBusPtyTransport
+
+pty = uModBusPtyTransport()
+server = uModBusSerialServer(pty.peer(), 115200, 1,
+                             hr=uModBusSequentialDataBank(200, [42]*100))
+
+
+def serve():
+    while True:
+        server.update()
+        time.sleep(0.001)
+
+
+_thread.start_new_thread(serve, ())
+
+modbus = uModBusSerial(pty, baudrate=115200)
+while True:
+    try:
+        print(modbus.read_holding_registers(1, 200, 10))
+        time.sleep(1)
+    except KeyboardInterrupt:
+        break
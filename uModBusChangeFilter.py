@@ -0,0 +1,124 @@
+import struct
+from array import array
+import uModBusConst as Const
+
+###
+# Report-by-exception: every polled block is compared against the last
+# reported one in a single pass over a packed array, and only the indices
+# whose value moved past the deadband are reported. The reference value of
+# an index is only replaced when it is reported, so slow drift still gets
+# through once it adds up to more than the deadband.
+###
+
+# struct format -> (registers per value, array typecode)
+_FORMATS = {
+    'h': (1, 'h'),
+    'H': (1, 'H'),
+    'i': (2, 'l'),
+    'I': (2, 'L'),
+    'f': (2, 'f'),
+}
+
+
+def decode_registers(registers, fmt='h'):
+    """ Decode unsigned register words into typed values, 32-bit values are big-endian word order """
+    words = _FORMATS[fmt][0]
+    if len(registers) % words:
+        raise ValueError('register count not a multiple of {} for format {}'.format(words, fmt))
+    count = len(registers) // words
+    if fmt == 'H':
+        return registers
+    return struct.unpack('>' + fmt * count, struct.pack('>{}H'.format(count * words), *registers))
+
+
+class uModBusChangeFilter:
+    def __init__(self, fmt='H', deadband=0, percent=False):
+        """ Initialize the change filter
+        :param fmt: The array typecode the reference values are kept in
+        :param deadband: Minimum change that is reported, 0 reports every change
+        :param percent: Interpret deadband as percent of the reference value
+        """
+        self.fmt = fmt
+        self.deadband = deadband
+        self.percent = percent
+        self.last = None
+
+    def reset(self):
+        self.last = None
+
+    def update(self, values):
+        """ Compare a new block with the reference values
+        :returns: The indices that changed
+        """
+        last = self.last
+        if last is None or len(last) != len(values):
+            self.last = array(self.fmt, values)
+            return list(range(len(values)))
+
+        changed = []
+        deadband = self.deadband
+        if not deadband:
+            for index, value in enumerate(values):
+                if value != last[index]:
+                    last[index] = value
+                    changed.append(index)
+        elif self.percent:
+            factor = deadband / 100
+            for index, value in enumerate(values):
+                previous = last[index]
+                if abs(value - previous) > abs(previous) * factor or (previous == 0 and value != 0):
+                    last[index] = value
+                    changed.append(index)
+        else:
+            for index, value in enumerate(values):
+                if abs(value - last[index]) > deadband:
+                    last[index] = value
+                    changed.append(index)
+        return changed
+
+
+class uModBusChangeReporter:
+    """ Wraps a client so its reads return only the (address, value) pairs that changed since the last report """
+
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+
+    def _filter(self, key, fmt, deadband, percent):
+        # the deadband is part of the key so every setting keeps its own reference values
+        key = key + (deadband, percent)
+        change_filter = self.filters.get(key)
+        if change_filter is None:
+            change_filter = uModBusChangeFilter(fmt, deadband, percent)
+            self.filters[key] = change_filter
+        return change_filter
+
+    def _report_bits(self, function_code, slave_addr, starting_addr, values):
+        change_filter = self._filter((slave_addr, function_code, starting_addr, len(values)), 'B', 0, False)
+        return [(starting_addr + index, values[index]) for index in change_filter.update(values)]
+
+    def _report_registers(self, function_code, slave_addr, starting_addr, registers, fmt, deadband, percent):
+        words, typecode = _FORMATS[fmt]
+        values = decode_registers(registers, fmt)
+        change_filter = self._filter((slave_addr, function_code, starting_addr, len(registers), fmt),
+                                     typecode, deadband, percent)
+        return [(starting_addr + index * words, values[index]) for index in change_filter.update(values)]
+
+    def read_coils(self, slave_addr, starting_addr, coil_qty):
+        values = self.client.read_coils(slave_addr, starting_addr, coil_qty)[:coil_qty]
+        return self._report_bits(Const.READ_COILS, slave_addr, starting_addr, values)
+
+    def read_discrete_inputs(self, slave_addr, starting_addr, input_qty):
+        values = self.client.read_discrete_inputs(slave_addr, starting_addr, input_qty)[:input_qty]
+        return self._report_bits(Const.READ_DISCRETE_INPUTS, slave_addr, starting_addr, values)
+
+    def read_holding_registers(self, slave_addr, starting_addr, register_qty, fmt='h', deadband=0, percent=False):
+        registers = self.client.read_holding_registers(slave_addr, starting_addr, register_qty, False)
+        return self._report_registers(Const.READ_HOLDING_REGISTERS, slave_addr, starting_addr, registers,
+                                      fmt, deadband, percent)
+
+    def read_input_registers(self, slave_addr, starting_address, register_quantity, fmt='h', deadband=0,
+                             percent=False):
+        registers = self.client.read_input_registers(slave_addr, starting_address, register_quantity, False)
+        return self._report_registers(Const.READ_INPUT_REGISTER, slave_addr, starting_address, registers,
+                                      fmt, deadband, percent)
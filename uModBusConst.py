@@ -44,6 +44,13 @@ ERROR_RESP_LEN = 0x05
 FIXED_RESP_LEN = 0x08
 MBAP_HDR_LENGTH = 0x07
 
+# quantity limits per request
+MAX_READ_BITS = 2000
+MAX_READ_REGISTERS = 125
+MAX_WRITE_COILS = 1968
+MAX_WRITE_REGISTERS = 123
+MAX_FIFO_COUNT = 31
+
 CRC16_TABLE = (
     0x0000, 0xC0C1, 0xC181, 0x0140, 0xC301, 0x03C0, 0x0280, 0xC241, 0xC601,
     0x06C0, 0x0780, 0xC741, 0x0500, 0xC5C1, 0xC481, 0x0440, 0xCC01, 0x0CC0,
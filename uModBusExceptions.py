@@ -0,0 +1,34 @@
+###
+# Kept apart from uModBusServer so client-only devices can raise them
+# without loading the server module.
+###
+
+
+class ModbusException(Exception):
+    """ Base modbus exception """
+
+    def __init__(self, string):
+        """ Initialize the exception
+        :param string: The message to append to the error
+        """
+        self.string = string
+        super().__init__(self.string)
+
+    def __str__(self):
+        return 'Modbus Error: %s' % self.string
+
+    @classmethod
+    def isError(cls):
+        """Error"""
+        return True
+
+
+class NotImplementedException(ModbusException):
+    """ Error resulting from not implemented function """
+
+    def __init__(self, string=""):
+        """ Initialize the exception
+        :param string: The message to append to the error
+        """
+        message = "[Not Implemented] %s" % string
+        ModbusException.__init__(self, message)
@@ -5,33 +5,37 @@ import struct
 
 
 def read_coils(starting_address, quantity):
-    if not (1 <= quantity <= 2000):
+    if not (1 <= quantity <= Const.MAX_READ_BITS):
         raise ValueError('invalid number of coils')
 
     return struct.pack('>BHH', Const.READ_COILS, starting_address, quantity)
 
 
 def read_discrete_inputs(starting_address, quantity):
-    if not (1 <= quantity <= 2000):
+    if not (1 <= quantity <= Const.MAX_READ_BITS):
         raise ValueError('invalid number of discrete inputs')
 
     return struct.pack('>BHH', Const.READ_DISCRETE_INPUTS, starting_address, quantity)
 
 
 def read_holding_registers(starting_address, quantity):
-    if not (1 <= quantity <= 125):
+    if not (1 <= quantity <= Const.MAX_READ_REGISTERS):
         raise ValueError('invalid number of holding registers')
 
     return struct.pack('>BHH', Const.READ_HOLDING_REGISTERS, starting_address, quantity)
 
 
 def read_input_registers(starting_address, quantity):
-    if not (1 <= quantity <= 125):
+    if not (1 <= quantity <= Const.MAX_READ_REGISTERS):
         raise ValueError('invalid number of input registers')
 
     return struct.pack('>BHH', Const.READ_INPUT_REGISTER, starting_address, quantity)
 
 
+def read_fifo_queue(fifo_pointer_address):
+    return struct.pack('>BH', Const.READ_FIFO_QUEUE, fifo_pointer_address)
+
+
 def write_single_coil(output_address, output_value):
     if output_value not in [0x0000, 0xFF00]:
         raise ValueError('Illegal coil value')
@@ -46,7 +50,12 @@ def write_single_register(register_address, register_value, signed=True):
 
 
 def write_multiple_coils(starting_address, value_list):
-    sectioned_list = [value_list[i:i + 8] for i in range(0, len(value_list), 8)]
+    quantity = len(value_list)
+
+    if not (1 <= quantity <= Const.MAX_WRITE_COILS):
+        raise ValueError('invalid number of coils')
+
+    sectioned_list = [value_list[i:i + 8] for i in range(0, quantity, 8)]
 
     output_value = []
     for index, byte in enumerate(sectioned_list):
@@ -56,13 +65,13 @@ def write_multiple_coils(starting_address, value_list):
     fmt = 'B' * len(output_value)
 
     return struct.pack('>BHHB' + fmt, Const.WRITE_MULTIPLE_COILS, starting_address,
-                       len(value_list), (len(value_list) // 8) + 1, *output_value)
+                       quantity, len(output_value), *output_value)
 
 
 def write_multiple_registers(starting_address, register_values, signed=True):
     quantity = len(register_values)
 
-    if not (1 <= quantity <= 123):
+    if not (1 <= quantity <= Const.MAX_WRITE_REGISTERS):
         raise ValueError('invalid number of registers')
 
     fmt = ('h' if signed else 'H') * quantity
@@ -70,6 +79,17 @@ def write_multiple_registers(starting_address, register_values, signed=True):
                        quantity, quantity * 2, *register_values)
 
 
+def chunk_span(starting_address, quantity, max_quantity):
+    if quantity < 1:
+        raise ValueError('invalid quantity')
+
+    end_address = starting_address + quantity
+    while starting_address < end_address:
+        chunk = min(max_quantity, end_address - starting_address)
+        yield starting_address, chunk
+        starting_address += chunk
+
+
 def validate_resp_data(data, function_code, address, value=None, quantity=None, signed=True):
     if function_code in [Const.WRITE_SINGLE_COIL, Const.WRITE_SINGLE_REGISTER]:
         fmt = '>H' + ('h' if signed else 'H')
@@ -0,0 +1,148 @@
+import _thread
+import logging
+
+###
+# Every bus gets its own worker thread and request queue. Client calls block
+# for the duration of a transaction, so a cycle over several UARTs takes as
+# long as the slowest bus instead of the sum of all of them.
+###
+
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+class uModBusCollector:
+    def __init__(self):
+        self._lock = _thread.allocate_lock()
+        self.values = {}
+        self.errors = {}
+
+    def put(self, key, value):
+        with self._lock:
+            self.values[key] = value
+            self.errors.pop(key, None)
+
+    def put_error(self, key, error):
+        with self._lock:
+            self.errors[key] = error
+            self.values.pop(key, None)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self.values.get(key, default)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.values), dict(self.errors)
+
+
+class uModBusPollBatch:
+    def __init__(self, count):
+        self._lock = _thread.allocate_lock()
+        self._done = _thread.allocate_lock()
+        self.pending = count
+        if count:
+            self._done.acquire()
+
+    def complete(self):
+        with self._lock:
+            self.pending -= 1
+            if self.pending == 0:
+                self._done.release()
+
+    def wait(self):
+        with self._done:
+            pass
+
+
+class uModBusBusWorker:
+    def __init__(self, name, client, collector):
+        self.name = name
+        self.client = client
+        self.collector = collector
+        self._lock = _thread.allocate_lock()
+        self._wakeup = _thread.allocate_lock()
+        self._wakeup.acquire()
+        self._queue = []
+        self.running = False
+
+    def start(self):
+        self.running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        self.running = False
+        self._signal()
+
+    def submit(self, key, method, args, batch=None):
+        with self._lock:
+            self._queue.append((key, method, args, batch))
+        self._signal()
+
+    def pending(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _signal(self):
+        with self._lock:
+            if self._wakeup.locked():
+                self._wakeup.release()
+
+    def _next(self):
+        with self._lock:
+            if self._queue:
+                return self._queue.pop(0)
+        return None
+
+    def _run(self):
+        while self.running:
+            self._wakeup.acquire()
+            item = self._next()
+            while item is not None:
+                self._execute(*item)
+                item = self._next()
+
+    def _execute(self, key, method, args, batch):
+        try:
+            self.collector.put(key, getattr(self.client, method)(*args))
+        except Exception as e:
+            _logger.error("{}: {} failed: {}".format(self.name, key, e))
+            self.collector.put_error(key, e)
+        if batch is not None:
+            batch.complete()
+
+
+class uModBusMultiBusPoller:
+    def __init__(self, collector=None):
+        self.collector = uModBusCollector() if collector is None else collector
+        self.buses = {}
+
+    def add_bus(self, name, client):
+        worker = uModBusBusWorker(name, client, self.collector)
+        self.buses[name] = worker
+        worker.start()
+        return worker
+
+    def submit(self, bus, key, method, *args):
+        """ Queue one client call on a bus without waiting for it
+        :param bus: The name the bus was registered with
+        :param key: The key the result is stored under in the collector
+        :param method: The client method name, e.g. 'read_holding_registers'
+        """
+        self.buses[bus].submit(key, method, args)
+
+    def poll(self, requests):
+        """ Run one poll cycle over all buses in parallel and wait for it to finish
+        :param requests: A dict of bus name to a list of (key, method, args) tuples
+        """
+        batch = uModBusPollBatch(sum(len(reqs) for reqs in requests.values()))
+        for bus, reqs in requests.items():
+            worker = self.buses[bus]
+            for key, method, args in reqs:
+                worker.submit(key, method, args, batch)
+        batch.wait()
+        return self.collector
+
+    def stop(self):
+        for worker in self.buses.values():
+            worker.stop()
@@ -0,0 +1,114 @@
+from uModBusTime import ticks_ms, ticks_diff, ticks_add, sleep_ms
+
+###
+# Per-unit round trip time estimation follows RFC 6298 (TCP retransmission
+# timer): SRTT/RTTVAR smoothing with alpha = 1/8 and beta = 1/4, and a
+# timeout of SRTT + 4 * RTTVAR clamped to [min_timeout_ms, max_timeout_ms].
+###
+
+
+class uModBusUnitState:
+    def __init__(self, timeout_ms):
+        self.srtt = None
+        self.rttvar = 0
+        self.rto = timeout_ms
+        self.failures = 0
+        self.open_until = None
+
+    def __str__(self):
+        return "UnitState(srtt={}, rttvar={}, rto={}, failures={})".format(self.srtt, self.rttvar,
+                                                                          self.rto, self.failures)
+
+
+class uModBusUnitTracker:
+    def __init__(self, initial_timeout_ms=1000, min_timeout_ms=50, max_timeout_ms=5000, retries=2,
+                 backoff_ms=20, failure_threshold=3, open_time_ms=10000):
+        self.initial_timeout_ms = initial_timeout_ms
+        self.min_timeout_ms = min_timeout_ms
+        self.max_timeout_ms = max_timeout_ms
+        self.retries = retries
+        self.backoff_ms = backoff_ms
+        self.failure_threshold = failure_threshold
+        self.open_time_ms = open_time_ms
+        self.units = {}
+
+    def state(self, unit):
+        state = self.units.get(unit)
+        if state is None:
+            state = uModBusUnitState(self._clamp(self.initial_timeout_ms))
+            self.units[unit] = state
+        return state
+
+    def _clamp(self, timeout_ms):
+        return max(self.min_timeout_ms, min(self.max_timeout_ms, timeout_ms))
+
+    def timeout_ms(self, unit, attempt=0):
+        # exponential backoff of the timer on retransmission
+        return int(self._clamp(self.state(unit).rto * (1 << attempt)))
+
+    def is_open(self, unit):
+        state = self.state(unit)
+        if state.open_until is None:
+            return False
+        if ticks_diff(state.open_until, ticks_ms()) > 0:
+            return True
+        # half-open: let the next transaction probe the unit
+        state.open_until = None
+        return False
+
+    def success(self, unit, rtt_ms, sample=True):
+        state = self.state(unit)
+        state.failures = 0
+        state.open_until = None
+        if not sample:
+            # Karn's algorithm: a reply to a retransmitted request is ambiguous
+            return
+        if state.srtt is None:
+            state.srtt = rtt_ms
+            state.rttvar = rtt_ms / 2
+        else:
+            state.rttvar = 0.75 * state.rttvar + 0.25 * abs(state.srtt - rtt_ms)
+            state.srtt = 0.875 * state.srtt + 0.125 * rtt_ms
+        state.rto = self._clamp(int(state.srtt + max(1, 4 * state.rttvar)))
+
+    def failure(self, unit):
+        state = self.state(unit)
+        state.failures += 1
+        state.rto = self._clamp(state.rto * 2)
+        if state.failures >= self.failure_threshold:
+            state.open_until = ticks_add(ticks_ms(), self.open_time_ms)
+
+    def reset(self, unit=None):
+        if unit is None:
+            self.units = {}
+        else:
+            self.units.pop(unit, None)
+
+    def transact(self, unit, request, retries=None, measure=None):
+        """ Run request(timeout_ms) with adaptive timeout, retries and circuit breaking
+        :param unit: The slave address the transaction is sent to
+        :param request: Callable performing one attempt, raising OSError on timeout or corrupt reply
+        :param retries: Overrides the number of retries, 0 for requests that must not be repeated
+        :param measure: Callable returning the slave's turnaround of the successful attempt in ms,
+                        the elapsed time of the attempt is used if None
+        """
+        if retries is None:
+            retries = self.retries
+        if self.is_open(unit):
+            raise OSError('slave {:d} skipped: too many consecutive failures'.format(unit))
+
+        attempt = 0
+        while True:
+            start = ticks_ms()
+            try:
+                result = request(self.timeout_ms(unit, attempt))
+            except OSError:
+                if attempt >= retries:
+                    self.failure(unit)
+                    raise
+                sleep_ms(int(self.backoff_ms * (1 << attempt)))
+                attempt += 1
+                continue
+            elapsed = ticks_diff(ticks_ms(), start)
+            self.success(unit, elapsed if measure is None else measure(), sample=(attempt == 0))
+            return result
@@ -0,0 +1,126 @@
+import struct
+import time
+import uModBusConst as Const
+
+###
+# Fixed-size ring of timestamped register blocks kept in one preallocated
+# bytearray. A record is a big-endian uint32 timestamp in seconds and a
+# uint16 millisecond part, followed by the registers exactly as they travel
+# on the wire (big-endian words), so raw client responses are copied in
+# without decoding, and the binary export is written straight from the
+# storage.
+#
+# Timestamps are wall-clock time. The epoch differs between ports (1970 on
+# CPython and Unix, 2000 on most MicroPython boards), so the binary header
+# records the epoch year. Timestamps passed in by the caller are seconds
+# (int or float) on the same clock.
+###
+
+TIMESTAMP_FORMAT = '>LH'
+TIMESTAMP_LENGTH = 6
+BINARY_MAGIC = b'MBRB'
+# magic, registers per sample, sample count, epoch year of the timestamps
+BINARY_HEADER = '>4sHLH'
+
+
+def epoch_year():
+    return time.gmtime(0)[0]
+
+
+def wall_clock():
+    """ Wall-clock time as (seconds, milliseconds), without going through a float """
+    if hasattr(time, 'time_ns'):
+        ms = time.time_ns() // 1000000
+        return ms // 1000, ms % 1000
+    # ports without time_ns() only have whole seconds
+    return int(time.time()), 0
+
+
+class uModBusRingBuffer:
+    def __init__(self, capacity, quantity):
+        """ Initialize the ring buffer
+        :param capacity: Number of samples kept before the oldest ones are overwritten
+        :param quantity: Registers per sample
+        """
+        self.capacity = capacity
+        self.quantity = quantity
+        self.record_size = TIMESTAMP_LENGTH + 2 * quantity
+        self._data = bytearray(capacity * self.record_size)
+        self._view = memoryview(self._data)
+        self._head = 0
+        self.count = 0
+        self.overwritten = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self._head = 0
+        self.count = 0
+
+    def _next_record(self, timestamp):
+        offset = self._head * self.record_size
+        if timestamp is None:
+            seconds, ms = wall_clock()
+        else:
+            seconds = int(timestamp)
+            ms = int((timestamp - seconds) * 1000)
+        struct.pack_into(TIMESTAMP_FORMAT, self._data, offset, seconds & 0xFFFFFFFF, ms)
+        self._head = (self._head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.overwritten += 1
+        return offset + TIMESTAMP_LENGTH
+
+    def append(self, values, timestamp=None):
+        if len(values) != self.quantity:
+            raise ValueError('sample size mismatch')
+        struct.pack_into('>{}H'.format(self.quantity), self._data, self._next_record(timestamp),
+                         *[v & 0xFFFF for v in values])
+
+    def append_raw(self, data, timestamp=None):
+        """ Store register data as received from the device (big-endian words) """
+        if len(data) != 2 * self.quantity:
+            raise ValueError('sample size mismatch')
+        offset = self._next_record(timestamp)
+        self._view[offset:offset + len(data)] = data
+
+    def store(self, client, slave_addr, function_code, starting_addr, timestamp=None):
+        """ Read one sample from the client straight into the ring """
+        if function_code == Const.READ_INPUT_REGISTER:
+            data = client.read_input_registers_raw(slave_addr, starting_addr, self.quantity)
+        elif function_code == Const.READ_HOLDING_REGISTERS:
+            data = client.read_holding_registers_raw(slave_addr, starting_addr, self.quantity)
+        else:
+            raise ValueError('unsupported function code: {:d}'.format(function_code))
+        self.append_raw(data, timestamp)
+
+    def _spans(self):
+        # oldest to newest as at most two contiguous slices of the storage
+        start = (self._head - self.count) % self.capacity
+        end = start + self.count
+        if end <= self.capacity:
+            return ((start, end),)
+        return ((start, self.capacity), (0, end - self.capacity))
+
+    def samples(self, signed=False):
+        """ Yield (seconds, milliseconds, values) oldest first """
+        fmt = TIMESTAMP_FORMAT + ('h' if signed else 'H') * self.quantity
+        for start, end in self._spans():
+            for index in range(start, end):
+                sample = struct.unpack_from(fmt, self._data, index * self.record_size)
+                yield sample[0], sample[1], sample[2:]
+
+    def export_binary(self, stream, header=True):
+        """ Write all samples oldest first, without copying them
+        :param header: Prefix the records with magic, quantity, sample count and timestamp epoch year
+        """
+        if header:
+            stream.write(struct.pack(BINARY_HEADER, BINARY_MAGIC, self.quantity, self.count, epoch_year()))
+        for start, end in self._spans():
+            stream.write(self._view[start * self.record_size:end * self.record_size])
+
+    def export_csv(self, stream, signed=False):
+        for seconds, ms, values in self.samples(signed):
+            stream.write('{}.{:03d},{}\n'.format(seconds, ms, ','.join(str(v) for v in values)))
@@ -0,0 +1,191 @@
+import logging
+import uModBusConst as Const
+from uModBusTime import ticks_ms, ticks_diff, ticks_add, sleep_ms
+
+###
+# Tags are scanned against absolute deadlines (next = previous deadline +
+# period), so scan rates do not drift with the time spent on the bus. Tags
+# that are due at the same time are merged into one read per slave and
+# function. Due reads are dispatched by priority first (the highest tag
+# priority in the read) and earliest deadline first within one priority, so
+# a saturated bus delays low-priority tags before high-priority ones.
+###
+
+_logger = logging.getLogger(__name__)
+_logger.setLevel(logging.INFO)
+
+
+class uModBusTag:
+    def __init__(self, name, slave_addr, function_code, address, quantity=1, period_ms=1000, priority=0,
+                 signed=True):
+        self.name = name
+        self.slave_addr = slave_addr
+        self.function_code = function_code
+        self.address = address
+        self.quantity = quantity
+        self.period_ms = period_ms
+        self.priority = priority
+        self.signed = signed
+        self.deadline = None
+        self.value = None
+        self.error = None
+        self.updated_ms = None
+
+    def __str__(self):
+        return "Tag({}, {}ms, value={})".format(self.name, self.period_ms, self.value)
+
+
+class uModBusScanStats:
+    def __init__(self, period_ms):
+        self.period_ms = period_ms
+        self.scans = 0
+        self.overruns = 0
+        self.jitter_min = None
+        self.jitter_max = None
+        self.jitter_sum = 0
+
+    def record(self, lateness_ms):
+        self.scans += 1
+        self.jitter_sum += lateness_ms
+        if self.jitter_min is None or lateness_ms < self.jitter_min:
+            self.jitter_min = lateness_ms
+        if self.jitter_max is None or lateness_ms > self.jitter_max:
+            self.jitter_max = lateness_ms
+
+    def jitter_mean(self):
+        return self.jitter_sum / self.scans if self.scans else 0
+
+    def __str__(self):
+        return "ScanClass({}ms: scans={}, overruns={}, jitter min/mean/max={}/{:.1f}/{}ms)".format(
+            self.period_ms, self.scans, self.overruns, self.jitter_min, self.jitter_mean(), self.jitter_max)
+
+
+class uModBusScheduler:
+    def __init__(self, client, max_gap=0, on_update=None):
+        """ Initialize the scheduler
+        :param client: A uModBusSerial or uModBusTCP instance
+        :param max_gap: Unused addresses allowed between two tags merged into one read
+        :param on_update: Called with each tag after it has been read
+        """
+        self.client = client
+        self.max_gap = max_gap
+        self.on_update = on_update
+        self.tags = []
+        self.stats = {}
+
+    def add_tag(self, tag):
+        if tag.period_ms <= 0:
+            raise ValueError('Illegal scan period: {}'.format(tag.period_ms))
+        if tag.deadline is None:
+            tag.deadline = ticks_ms()
+        if tag.period_ms not in self.stats:
+            self.stats[tag.period_ms] = uModBusScanStats(tag.period_ms)
+        self.tags.append(tag)
+        return tag
+
+    def _limit(self, function_code):
+        if function_code in (Const.READ_COILS, Const.READ_DISCRETE_INPUTS):
+            return Const.MAX_READ_BITS
+        return Const.MAX_READ_REGISTERS
+
+    def _due_groups(self, now):
+        due = {}
+        for tag in self.tags:
+            if ticks_diff(now, tag.deadline) >= 0:
+                key = (tag.slave_addr, tag.function_code)
+                due.setdefault(key, []).append(tag)
+
+        groups = []
+        for (slave_addr, function_code), tags in due.items():
+            limit = self._limit(function_code)
+            tags.sort(key=lambda t: t.address)
+            group = None
+            for tag in tags:
+                if group is not None:
+                    end = max(group[1], tag.address + tag.quantity)
+                    if tag.address <= group[1] + self.max_gap and end - group[0] <= limit:
+                        group[1] = end
+                        group[2].append(tag)
+                        continue
+                    groups.append(group)
+                group = [tag.address, tag.address + tag.quantity, [tag], slave_addr, function_code]
+            groups.append(group)
+        return groups
+
+    def _urgency(self, group, now):
+        # highest priority first, earliest deadline first within a priority
+        return (-max(tag.priority for tag in group[2]),
+                -max(ticks_diff(now, tag.deadline) for tag in group[2]))
+
+    def _read(self, slave_addr, function_code, address, quantity):
+        if function_code == Const.READ_COILS:
+            return self.client.read_coils(slave_addr, address, quantity)
+        elif function_code == Const.READ_DISCRETE_INPUTS:
+            return self.client.read_discrete_inputs(slave_addr, address, quantity)
+        elif function_code == Const.READ_HOLDING_REGISTERS:
+            return self.client.read_holding_registers(slave_addr, address, quantity, False)
+        elif function_code == Const.READ_INPUT_REGISTER:
+            return self.client.read_input_registers(slave_addr, address, quantity, False)
+        raise ValueError('unsupported function code: {:d}'.format(function_code))
+
+    def _dispatch(self, group):
+        start, end, tags, slave_addr, function_code = group
+        started = ticks_ms()
+        try:
+            values = self._read(slave_addr, function_code, start, end - start)
+            error = None
+        except Exception as e:
+            _logger.error("read {}:{}+{} failed: {}".format(slave_addr, start, end - start, e))
+            values = None
+            error = e
+        finished = ticks_ms()
+
+        for tag in tags:
+            self.stats[tag.period_ms].record(ticks_diff(started, tag.deadline))
+            tag.error = error
+            if values is not None:
+                offset = tag.address - start
+                block = values[offset:offset + tag.quantity]
+                if tag.signed and function_code in (Const.READ_HOLDING_REGISTERS, Const.READ_INPUT_REGISTER):
+                    block = tuple(v - 0x10000 if v & 0x8000 else v for v in block)
+                tag.value = block[0] if tag.quantity == 1 else block
+                tag.updated_ms = finished
+            self._advance(tag, finished)
+            if self.on_update is not None:
+                self.on_update(tag)
+
+    def _advance(self, tag, now):
+        tag.deadline = ticks_add(tag.deadline, tag.period_ms)
+        if ticks_diff(now, tag.deadline) >= 0:
+            # the next scan is already late: skip the missed periods and count an overrun
+            missed = ticks_diff(now, tag.deadline) // tag.period_ms + 1
+            self.stats[tag.period_ms].overruns += missed
+            tag.deadline = ticks_add(tag.deadline, missed * tag.period_ms)
+
+    def run_pending(self):
+        """ Dispatch due reads until nothing is due any more
+        :returns: The number of transactions sent
+        """
+        count = 0
+        while True:
+            now = ticks_ms()
+            groups = self._due_groups(now)
+            if not groups:
+                return count
+            # re-plan after every transaction so tags that became due meanwhile compete too
+            groups.sort(key=lambda group: self._urgency(group, now))
+            self._dispatch(groups[0])
+            count += 1
+
+    def next_deadline_ms(self):
+        """ Milliseconds until the next tag is due """
+        if not self.tags:
+            return None
+        now = ticks_ms()
+        return max(0, min(ticks_diff(tag.deadline, now) for tag in self.tags))
+
+    def run(self):
+        while True:
+            self.run_pending()
+            delay = self.next_deadline_ms()
+            sleep_ms(100 if delay is None else delay)
@@ -3,21 +3,26 @@
 
 import uModBusFunctions as functions
 import uModBusConst as Const
-from machine import UART
-from machine import Pin
+from uModBusRetry import uModBusUnitTracker
+from uModBusSerialTiming import uModBusSerialTiming, uModBusDirectionControl
+from uModBusTime import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms
+from uModBusTransport import as_transport
 import struct
-import time
 
 
 class uModBusSerial:
 
-    def __init__(self, uart: UART, baudrate=9600, data_bits=8, stop_bits=0, ctrl_pin=None):
-        self._uart = uart
-        if ctrl_pin is not None:
-            self._ctrlPin = Pin(ctrl_pin, mode=Pin.OUT)
-        else:
-            self._ctrlPin = None
-        self.char_time_ms = (1000 * (data_bits + stop_bits + 2)) // baudrate
+    def __init__(self, uart, baudrate=9600, data_bits=8, stop_bits=1, ctrl_pin=None,
+                 timeout_ms=2000, retries=2, tracker=None, parity=None):
+        self._uart = as_transport(uart)
+        self._rx_buf = bytearray(256)
+        self._rx_view = memoryview(self._rx_buf)
+        if tracker is None:
+            tracker = uModBusUnitTracker(initial_timeout_ms=timeout_ms, max_timeout_ms=timeout_ms, retries=retries)
+        self.tracker = tracker
+        self.timing = uModBusSerialTiming(baudrate, data_bits, parity, stop_bits)
+        self._direction = uModBusDirectionControl(self._uart, self.timing, ctrl_pin)
+        self._turnaround_ms = None
 
     def _calculate_crc16(self, data):
         crc = 0xFFFF
@@ -41,6 +46,8 @@ class uModBusSerial:
         return struct.unpack(fmt, byte_array)
 
     def _exit_read(self, response):
+        if len(response) < Const.RESPONSE_HDR_LENGTH + 1:
+            return False
         if response[1] >= Const.ERROR_BIAS:
             if len(response) < Const.ERROR_RESP_LEN:
                 return False
@@ -48,26 +55,64 @@ class uModBusSerial:
             expected_len = Const.RESPONSE_HDR_LENGTH + 1 + response[2] + Const.CRC_LENGTH
             if len(response) < expected_len:
                 return False
+        elif response[1] == Const.READ_FIFO_QUEUE:
+            if len(response) < Const.RESPONSE_HDR_LENGTH + 2:
+                return False
+            byte_count = (response[2] << 8) | response[3]
+            if len(response) < Const.RESPONSE_HDR_LENGTH + 2 + byte_count + Const.CRC_LENGTH:
+                return False
         elif len(response) < Const.FIXED_RESP_LEN:
             return False
 
         return True
 
-    def _uart_read(self):
-        response = bytearray()
+    def _response_length(self, modbus_pdu):
+        # longest valid reply to a request, so its time on the line can be allowed for
+        function_code = modbus_pdu[0]
+        if function_code in (Const.READ_COILS, Const.READ_DISCRETE_INPUTS):
+            quantity = struct.unpack('>H', modbus_pdu[3:5])[0]
+            data_length = (quantity + 7) // 8
+        elif function_code in (Const.READ_HOLDING_REGISTERS, Const.READ_INPUT_REGISTER):
+            quantity = struct.unpack('>H', modbus_pdu[3:5])[0]
+            data_length = 2 * quantity
+        elif function_code == Const.READ_FIFO_QUEUE:
+            data_length = 3 + 2 * Const.MAX_FIFO_COUNT
+        else:
+            return Const.FIXED_RESP_LEN
+
+        return Const.RESPONSE_HDR_LENGTH + 1 + data_length + Const.CRC_LENGTH
+
+    def _uart_read(self, timeout_ms, tx_end_us, frame_ms):
+        # the returned view aliases the receive buffer and is only valid until the next request
+        # timeout_ms bounds the slave's turnaround, frame_ms is the time the frames spend on the line
+        length = 0
+        deadline = ticks_add(ticks_ms(), timeout_ms + frame_ms)
+        self._turnaround_ms = None
 
-        for x in range(1, 40):
+        while ticks_diff(deadline, ticks_ms()) > 0 and length < len(self._rx_buf):
             if self._uart.any():
-                response.extend(self._uart.read())
-                # response.extend(self._uart.readall())
+                if length == 0:
+                    self._turnaround_ms = max(0, ticks_diff(ticks_us(), tx_end_us) // 1000)
+                length += self._uart.readinto(self._rx_view[length:])
                 # variable length function codes may require multiple reads
-                if self._exit_read(response):
+                if self._exit_read(self._rx_view[:length]):
+                    self._direction.frame_received()
                     break
-            time.sleep(0.05)
+                # the slave is still sending, give the rest of the frame another turnaround
+                extended = ticks_add(ticks_ms(), timeout_ms)
+                if ticks_diff(extended, deadline) > 0:
+                    deadline = extended
+            else:
+                sleep_ms(1)
 
-        return response
+        return self._rx_view[:length]
 
-    def _send_receive(self, modbus_pdu, slave_addr, count):
+    def _send_receive(self, modbus_pdu, slave_addr, count, retries=None):
+        return self.tracker.transact(slave_addr,
+                                     lambda timeout_ms: self._transaction(modbus_pdu, slave_addr, count, timeout_ms),
+                                     retries, lambda: self._turnaround_ms)
+
+    def _transaction(self, modbus_pdu, slave_addr, count, timeout_ms):
         serial_pdu = bytearray()
         serial_pdu.append(slave_addr)
         serial_pdu.extend(modbus_pdu)
@@ -75,16 +120,14 @@ class uModBusSerial:
         crc = self._calculate_crc16(serial_pdu)
         serial_pdu.extend(crc)
 
+        self._direction.wait_idle()
         # flush the Rx FIFO
-        self._uart.read()
-        if self._ctrlPin:
-            self._ctrlPin(1)
-        self._uart.write(serial_pdu)
-        if self._ctrlPin:
-            time.sleep_ms(1 + self.char_time_ms)
-            self._ctrlPin(0)
+        self._uart.reset_input()
+        tx_end_us = self._direction.transmit(serial_pdu)
 
-        return self._validate_resp_hdr(self._uart_read(), slave_addr, modbus_pdu[0], count)
+        frame_ms = self.timing.tx_time_us(len(serial_pdu) + self._response_length(modbus_pdu)) // 1000 + 1
+        response = self._uart_read(timeout_ms, tx_end_us, frame_ms)
+        return self._validate_resp_hdr(response, slave_addr, modbus_pdu[0], count)
 
     def _validate_resp_hdr(self, response, slave_addr, function_code, count):
 
@@ -138,6 +181,70 @@ class uModBusSerial:
 
         return register_value
 
+    def read_fifo_queue(self, slave_addr, fifo_pointer_address, signed=True):
+        """ Read up to 31 of the oldest queue entries, never retried as the slave removes what it sends
+        :returns: The entries, 31 of them mean more may be queued
+        """
+        modbus_pdu = functions.read_fifo_queue(fifo_pointer_address)
+
+        resp_data = self._send_receive(modbus_pdu, slave_addr, False, retries=0)
+        byte_count, fifo_count = struct.unpack('>HH', resp_data[:4])
+        if byte_count != 2 + fifo_count * 2 or len(resp_data) < byte_count + 2:
+            raise ValueError('invalid FIFO queue response')
+
+        return self._to_short(resp_data[4:4 + fifo_count * 2], signed)
+
+    def read_holding_registers_raw(self, slave_addr, starting_addr, register_qty):
+        # the returned view aliases the receive buffer and is only valid until the next request
+        modbus_pdu = functions.read_holding_registers(starting_addr, register_qty)
+
+        return self._send_receive(modbus_pdu, slave_addr, True)
+
+    def read_input_registers_raw(self, slave_addr, starting_address, register_quantity):
+        # the returned view aliases the receive buffer and is only valid until the next request
+        modbus_pdu = functions.read_input_registers(starting_address, register_quantity)
+
+        return self._send_receive(modbus_pdu, slave_addr, True)
+
+    def _iter_read(self, read, slave_addr, starting_addr, quantity, max_quantity, chunk_size, *args):
+        chunk_size = min(chunk_size or max_quantity, max_quantity)
+        for address, count in functions.chunk_span(starting_addr, quantity, chunk_size):
+            yield address, read(slave_addr, address, count, *args)[:count]
+
+    def iter_coils(self, slave_addr, starting_addr, coil_qty, chunk_size=None):
+        return self._iter_read(self.read_coils, slave_addr, starting_addr, coil_qty,
+                               Const.MAX_READ_BITS, chunk_size)
+
+    def iter_discrete_inputs(self, slave_addr, starting_addr, input_qty, chunk_size=None):
+        return self._iter_read(self.read_discrete_inputs, slave_addr, starting_addr, input_qty,
+                               Const.MAX_READ_BITS, chunk_size)
+
+    def iter_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, chunk_size=None):
+        return self._iter_read(self.read_holding_registers, slave_addr, starting_addr, register_qty,
+                               Const.MAX_READ_REGISTERS, chunk_size, signed)
+
+    def iter_input_registers(self, slave_addr, starting_address, register_quantity, signed=True, chunk_size=None):
+        return self._iter_read(self.read_input_registers, slave_addr, starting_address, register_quantity,
+                               Const.MAX_READ_REGISTERS, chunk_size, signed)
+
+    def aiter_coils(self, slave_addr, starting_addr, coil_qty, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_coils(slave_addr, starting_addr, coil_qty, chunk_size))
+
+    def aiter_discrete_inputs(self, slave_addr, starting_addr, input_qty, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_discrete_inputs(slave_addr, starting_addr, input_qty, chunk_size))
+
+    def aiter_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_holding_registers(slave_addr, starting_addr, register_qty,
+                                                              signed, chunk_size))
+
+    def aiter_input_registers(self, slave_addr, starting_address, register_quantity, signed=True, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_input_registers(slave_addr, starting_address, register_quantity,
+                                                            signed, chunk_size))
+
     def write_single_coil(self, slave_addr, output_address, output_value):
         modbus_pdu = functions.write_single_coil(output_address, output_value)
 
@@ -2,42 +2,64 @@ import struct
 import logging
 import uModBusConst as Const
 from uModBusServer import uModBusSequentialServer
+from uModBusSerialTiming import uModBusSerialTiming, uModBusDirectionControl
+from uModBusTime import ticks_us, ticks_diff
+from uModBusTransport import as_transport
 
 
 _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.INFO)
 
 class uModBusSerialServer(uModBusSequentialServer):
-    def __init__(self, uart, baudrate, server_id, **kwargs):
-        self.uart = uart
+    def __init__(self, uart, baudrate, server_id, data_bits=8, parity=None, stop_bits=1, ctrl_pin=None, **kwargs):
+        self.uart = as_transport(uart)
         self.baudrate = baudrate
+        self._rx_buf = bytearray(256)
+        self._rx_view = memoryview(self._rx_buf)
+        self.timing = uModBusSerialTiming(baudrate, data_bits, parity, stop_bits)
+        self._direction = uModBusDirectionControl(self.uart, self.timing, ctrl_pin)
         super().__init__(server_id, **kwargs)
 
-    def _send_data(self, fx, data):
+    def _encode(self, fx, data):
         head = struct.pack('>BB', self.server_id, fx)
-        response = head + data + self._calculate_crc16(head + data)
-        self.uart.write(response)
+        return head + data + self._calculate_crc16(head + data)
+
+    def _send_frame(self, frame):
+        self._direction.transmit(frame)
 
     def _send_error_response(self, fx, exception):
         response = struct.pack('>B', exception)
         self._send_data(Const.ERROR_BIAS+fx, response)
 
+    def _read_frame(self):
+        # a frame ends once the line has been silent for t3.5
+        length = self.uart.readinto(self._rx_view)
+        last_rx = ticks_us()
+        while ticks_diff(ticks_us(), last_rx) < self.timing.t3_5_us and length < len(self._rx_buf):
+            if self.uart.any():
+                length += self.uart.readinto(self._rx_view[length:])
+                last_rx = ticks_us()
+        self._direction.frame_received()
+        return self._rx_view[:length]
+
     def update(self):
         if self.uart.any():
             # buffer = b'\x00\x03\x00\x00\x00\x01\x85\xdb'  # Read one holding reg from ID 0
-            # TODO: Needs to split messages, maybe?
-            buffer = self.uart.read()
+            buffer = self._read_frame()
             _logger.debug("Raw Input: {}".format(buffer))
-            if len(buffer) > 7:
+            if len(buffer) > 5:
                 server_id, fx = struct.unpack('>BB', buffer[:2])
                 if server_id != self.server_id:
                     return None
                 crc = buffer[-2:]
-                if crc != self._calculate_crc16(buffer[:-2]):
+                expected_crc = self._calculate_crc16(buffer[:-2])
+                if crc[0] != expected_crc[0] or crc[1] != expected_crc[1]:
                     # According to the MODBUS Application Protocol V1.1b, section 7:
                     # In the event of a CRC error, nothing is returned, and the client is allowed to time out.
-                    _logger.error("CRC Error: {} != {}".format(crc, self._calculate_crc16(buffer[:-2])))
+                    _logger.error("CRC Error: {} != {}".format(bytes(crc), expected_crc))
                     return None
                 payload = buffer[2:-2]
+                if not self._request_complete(fx, payload):
+                    return None
                 return self.handleRequest(fx, payload)
         return None
@@ -0,0 +1,86 @@
+from uModBusTime import ticks_us, ticks_diff, ticks_add, sleep_us
+
+###
+# Character and inter-frame timing follows the MODBUS over Serial Line
+# Specification V1.02, section 2.5.1.1: t3.5 scales with the character time
+# up to 19200 baud and is fixed at 1750 us above. The t1.5 inter-character
+# limit is not checked: a polled, buffered UART (or a USB adapter with its
+# latency timer) cannot observe gaps that short, broken frames are rejected
+# by their CRC instead.
+###
+
+
+class uModBusSerialTiming:
+    def __init__(self, baudrate, data_bits=8, parity=None, stop_bits=1):
+        self.baudrate = baudrate
+        # start bit + data bits + optional parity bit + stop bits
+        self.char_bits = 1 + data_bits + (0 if parity is None else 1) + max(1, stop_bits)
+        self.char_us = (self.char_bits * 1000000 + baudrate - 1) // baudrate
+        if baudrate > 19200:
+            self.t3_5_us = 1750
+        else:
+            self.t3_5_us = (self.char_us * 7 + 1) // 2
+
+    def tx_time_us(self, nbytes):
+        return nbytes * self.char_us
+
+    def __str__(self):
+        return "SerialTiming(baud={}, char={}us, t3.5={}us)".format(self.baudrate, self.char_us, self.t3_5_us)
+
+
+class uModBusDirectionControl:
+    """ Drives the RS-485 DE/RE pin around a transmission """
+
+    def __init__(self, uart, timing, ctrl_pin=None):
+        """ Initialize the direction control
+        :param uart: The UART the frames are written to
+        :param timing: The uModBusSerialTiming of the line
+        :param ctrl_pin: A Pin object or pin id driving DE/RE, None for full duplex lines
+        """
+        self._uart = uart
+        self.timing = timing
+        if ctrl_pin is not None and not callable(ctrl_pin):
+            from machine import Pin
+            ctrl_pin = Pin(ctrl_pin, mode=Pin.OUT)
+        self._ctrlPin = ctrl_pin
+        if self._ctrlPin is not None:
+            self._ctrlPin(0)
+        self._txdone = getattr(uart, 'txdone', None)
+        self._last_frame_us = None
+
+    def wait_idle(self):
+        # keep the bus silent for t3.5 between two frames
+        if self._last_frame_us is None:
+            return
+        remaining = self.timing.t3_5_us - ticks_diff(ticks_us(), self._last_frame_us)
+        if remaining > 0:
+            sleep_us(remaining)
+
+    def frame_received(self):
+        self._last_frame_us = ticks_us()
+
+    def transmit(self, frame):
+        """ Send a frame
+        :returns: The ticks_us at which its last character has left the line
+        """
+        if self._ctrlPin is not None:
+            self._ctrlPin(1)
+        start = ticks_us()
+        self._uart.write(frame)
+        if self._ctrlPin is not None:
+            self.wait_tx_done(start, len(frame))
+            self._ctrlPin(0)
+            self._last_frame_us = ticks_us()
+        else:
+            self._last_frame_us = ticks_add(start, self.timing.tx_time_us(len(frame)))
+        return self._last_frame_us
+
+    def wait_tx_done(self, start, nbytes):
+        # release the driver as soon as the last stop bit has left the shift register
+        if self._txdone is not None:
+            while not self._txdone():
+                pass
+        else:
+            remaining = self.timing.tx_time_us(nbytes) - ticks_diff(ticks_us(), start)
+            if remaining > 0:
+                sleep_us(remaining)
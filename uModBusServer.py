@@ -1,6 +1,8 @@
 import struct
 import logging
 import uModBusConst as Const
+from collections import OrderedDict
+from uModBusExceptions import ModbusException, NotImplementedException
 
 ###
 # The databank structure was heavily inspired by the pymodbus project
@@ -11,36 +13,6 @@ _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.INFO)
 
 
-class ModbusException(Exception):
-    """ Base modbus exception """
-
-    def __init__(self, string):
-        """ Initialize the exception
-        :param string: The message to append to the error
-        """
-        self.string = string
-        super().__init__(self.string)
-
-    def __str__(self):
-        return 'Modbus Error: %s' % self.string
-
-    @classmethod
-    def isError(cls):
-        """Error"""
-        return True
-
-
-class NotImplementedException(ModbusException):
-    """ Error resulting from not implemented function """
-
-    def __init__(self, string=""):
-        """ Initialize the exception
-        :param string: The message to append to the error
-        """
-        message = "[Not Implemented] %s" % string
-        ModbusException.__init__(self, message)
-
-
 class uModBusDataBank:
     def __init__(self, address, values, default):
         self.default_value = default
@@ -101,10 +73,132 @@ class uModBusSequentialDataBank(uModBusDataBank):
         self.values[start:start + len(values)] = values
 
 
+class uModBusFifoDataBank(uModBusDataBank):
+    """ FIFO queues read with READ_FIFO_QUEUE, keyed by their FIFO pointer address
+
+    A read returns and removes up to 31 of the oldest entries; a read returning
+    31 entries means more may be queued. With acknowledge=True a read leaves
+    the entries queued (every read returns them again) until the application
+    calls acknowledge(), e.g. from a write to a register it owns. When a queue
+    is full, pushing drops the oldest entries.
+    """
+
+    MAX_READ = Const.MAX_FIFO_COUNT
+
+    def __init__(self, addresses=(), maxlen=256, acknowledge=False):
+        self.maxlen = maxlen
+        self.acknowledged = acknowledge
+        self.dropped = 0
+        self._unacked = {}
+        super().__init__(0x00, {}, 0)
+        for address in addresses:
+            self.values[address] = []
+
+    @classmethod
+    def create(cls):
+        return cls()
+
+    def default(self, count, value=False):
+        self.values = {}
+        self._unacked = {}
+
+    def reset(self):
+        for address in self.values:
+            self.values[address] = []
+        self._unacked = {}
+
+    def validate(self, address, count=1):
+        return address in self.values
+
+    def push(self, address, values):
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        queue = self.values.setdefault(address, [])
+        queue.extend(v & 0xFFFF for v in values)
+        overflow = len(queue) - self.maxlen
+        if overflow > 0:
+            del queue[:overflow]
+            self.dropped += overflow
+            self._unacked[address] = max(0, self._unacked.get(address, 0) - overflow)
+
+    def getValues(self, address, count=MAX_READ):
+        queue = self.values[address]
+        values = queue[:min(count, self.MAX_READ, len(queue))]
+        if self.acknowledged:
+            self._unacked[address] = len(values)
+        else:
+            del queue[:len(values)]
+        return values
+
+    def acknowledge(self, address, count):
+        """ Remove up to count entries returned by the last read, a repeated call removes nothing
+        :returns: The number of entries removed
+        """
+        count = min(count, self._unacked.get(address, 0))
+        del self.values[address][:count]
+        self._unacked[address] = 0
+        return count
+
+    def setValues(self, address, values):
+        self.push(address, values)
+
+    def __str__(self):
+        return "FifoDataStore(%d queues, %d dropped)" % (len(self.values), self.dropped)
+
+    def __iter__(self):
+        return iter(self.values.items())
+
+
+class uModBusResponseCache:
+    """ LRU cache of encoded read responses keyed by (function, address, count)
+
+    Entries are invalidated by writes going through the server's setValues.
+    Changes made directly on a databank must be followed by clear().
+    """
+
+    def __init__(self, size=16):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        frame = self.entries.pop(key, None)
+        if frame is None:
+            self.misses += 1
+            return None
+        # re-insert to mark the entry as most recently used
+        self.entries[key] = frame
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        self.entries.pop(key, None)
+        while len(self.entries) >= self.size:
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = frame
+
+    def invalidate(self, fx, address, count=1):
+        stale = [key for key in self.entries
+                 if key[0] == fx and key[1] < address + count and address < key[1] + key[2]]
+        for key in stale:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries = OrderedDict()
+
+    def __str__(self):
+        return "ResponseCache(%d/%d, hits=%d, misses=%d)" % (len(self.entries), self.size, self.hits, self.misses)
+
+
 class uModBusServer:
     __fx_mapper = {2: 'd', 4: 'i'}
     __fx_mapper.update([(i, 'h') for i in [3, 6, 16, 22, 23]])
     __fx_mapper.update([(i, 'c') for i in [1, 5, 15]])
+    __fx_mapper[24] = 'f'
+    __read_fx = {'c': Const.READ_COILS, 'd': Const.READ_DISCRETE_INPUTS,
+                 'h': Const.READ_HOLDING_REGISTERS, 'i': Const.READ_INPUT_REGISTER,
+                 'f': Const.READ_FIFO_QUEUE}
 
     @classmethod
     def _calculate_crc16(cls, data):
@@ -118,6 +212,14 @@ class uModBusServer:
     def _decode(self, fx):
         return self.__fx_mapper[fx]
 
+    @classmethod
+    def _request_complete(cls, fx, payload):
+        # READ_FIFO_QUEUE only carries the pointer address, every other request at least address and count/value
+        return len(payload) >= (2 if fx == Const.READ_FIFO_QUEUE else 4)
+
+    def _read_fx(self, fx):
+        return self.__read_fx[self._decode(fx)]
+
     @classmethod
     def _bytes_to_bool(cls, byte_list):
         bool_list = []
@@ -149,8 +251,14 @@ class uModBusServer:
     def setValues(cls, fx, address, values):
         raise NotImplementedException("set context values")
 
+    def _encode(self, fx, data):
+        raise NotImplementedException("Encode frame")
+
+    def _send_frame(self, frame):
+        raise NotImplementedException("Send frame")
+
     def _send_data(self, fx, data):
-        raise NotImplementedException("Send data")
+        self._send_frame(self._encode(fx, data))
 
     def _send_error_response(self, fx, exception):
         raise NotImplementedException("Send error response")
@@ -164,6 +272,9 @@ class uModBusSequentialServer(uModBusServer):
         self.databank['c'] = kwargs.get('co', uModBusSequentialDataBank.create())
         self.databank['i'] = kwargs.get('ir', uModBusSequentialDataBank.create())
         self.databank['h'] = kwargs.get('hr', uModBusSequentialDataBank.create())
+        self.databank['f'] = kwargs.get('fifo', uModBusFifoDataBank.create())
+        cache_size = kwargs.get('cache_size', 0)
+        self.cache = uModBusResponseCache(cache_size) if cache_size else None
 
     def validate(self, fx, address, count=1):
         _logger.debug("validate: fc-[%d] address-%d: count-%d" % (fx, address,
@@ -178,34 +289,42 @@ class uModBusSequentialServer(uModBusServer):
     def setValues(self, fx, address, values):
         _logger.debug("setValues[%d] %d:%d" % (fx, address, len(values)))
         self.databank[self._decode(fx)].setValues(address, values)
+        if self.cache is not None:
+            self.cache.invalidate(self._read_fx(fx), address, len(values))
 
-    def handleRead(self, fx, buffer):
+    def _read_response(self, fx, address, count):
         if fx in (Const.READ_HOLDING_REGISTERS, Const.READ_INPUT_REGISTER):
-            _logger.debug("Read {} Register".format(fx))
-            address, count = struct.unpack('>HH', buffer[:4])
-            if self.validate(fx, address, count):
-                response = struct.pack('>B', count*2)
-                rsp_values = self.getValues(fx, address, count)
-                _logger.debug(rsp_values)
-                response += struct.pack('>{}H'.format(count), *list(rsp_values))
-                self._send_data(fx, response)
-            else:
-                self._send_error_response(fx, Const.ILLEGAL_DATA_ADDRESS)
+            response = struct.pack('>B', count*2)
+            rsp_values = self.getValues(fx, address, count)
+            _logger.debug(rsp_values)
+            response += struct.pack('>{}H'.format(count), *list(rsp_values))
         else:
-            _logger.debug("Read {} Register".format(fx))
-            address, count = struct.unpack('>HH', buffer[:4])
-            if self.validate(fx, address, count):
-                response = struct.pack('>B', (count + 7)//8)
-                values = self.getValues(fx, address, count)
-                payload = 0
-                for digit in reversed(values):
-                    payload = (payload << 1) | digit
-                payload = payload.to_bytes((count+7)//8, 'little')
-                # payload = int("".join(str(x) for x in values), 2).to_bytes((count+7)//8, 'big')
-                response += payload
-                self._send_data(fx, response)
-            else:
-                self._send_error_response(fx, Const.ILLEGAL_DATA_ADDRESS)
+            response = struct.pack('>B', (count + 7)//8)
+            values = self.getValues(fx, address, count)
+            payload = 0
+            for digit in reversed(values):
+                payload = (payload << 1) | digit
+            payload = payload.to_bytes((count+7)//8, 'little')
+            # payload = int("".join(str(x) for x in values), 2).to_bytes((count+7)//8, 'big')
+            response += payload
+        return response
+
+    def handleRead(self, fx, buffer):
+        _logger.debug("Read {} Register".format(fx))
+        address, count = struct.unpack('>HH', buffer[:4])
+        key = (fx, address, count)
+        if self.cache is not None:
+            frame = self.cache.get(key)
+            if frame is not None:
+                self._send_frame(frame)
+                return
+        if self.validate(fx, address, count):
+            frame = self._encode(fx, self._read_response(fx, address, count))
+            if self.cache is not None:
+                self.cache.put(key, frame)
+            self._send_frame(frame)
+        else:
+            self._send_error_response(fx, Const.ILLEGAL_DATA_ADDRESS)
 
     def handleWriteSingle(self, fx, buffer):
         _logger.debug("Write Single Coil or Register")
@@ -257,9 +376,22 @@ class uModBusSequentialServer(uModBusServer):
         else:
             self.handleWriteMultiple(fx, buffer)
 
+    def handleReadFifo(self, fx, buffer):
+        _logger.debug("Read FIFO Queue")
+        address = struct.unpack('>H', buffer[:2])[0]
+        if self.validate(fx, address):
+            values = self.getValues(fx, address, uModBusFifoDataBank.MAX_READ)
+            count = len(values)
+            response = struct.pack('>HH{}H'.format(count), 2 + count*2, count, *values)
+            self._send_data(fx, response)
+        else:
+            self._send_error_response(fx, Const.ILLEGAL_DATA_ADDRESS)
+
     def handleRequest(self, fx, buffer):
         if fx in (Const.READ_COILS, Const.READ_DISCRETE_INPUTS, Const.READ_HOLDING_REGISTERS, Const.READ_INPUT_REGISTER):
             self.handleRead(fx, buffer)
+        elif fx == Const.READ_FIFO_QUEUE:
+            self.handleReadFifo(fx, buffer)
         elif fx in (Const.WRITE_SINGLE_COIL, Const.WRITE_SINGLE_REGISTER, Const.WRITE_MULTIPLE_COILS, Const.WRITE_MULTIPLE_REGISTERS):
             self.handleWrite(fx, buffer)
         else:
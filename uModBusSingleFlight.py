@@ -0,0 +1,166 @@
+import _thread
+import uModBusConst as Const
+import uModBusFunctions as functions
+
+###
+# Concurrent reads of the same (unit, function, range) share one transaction:
+# the first caller becomes the leader and performs the read, later callers
+# whose range lies inside an in-flight read wait for it and take a slice of
+# its result. Transactions on the wrapped client are serialized; streaming
+# reads are chunked here so every chunk is a locked (and shareable) read.
+###
+
+
+class uModBusFlight:
+    def __init__(self, slave_addr, function_code, starting_addr, quantity):
+        self.slave_addr = slave_addr
+        self.function_code = function_code
+        self.starting_addr = starting_addr
+        self.quantity = quantity
+        self.result = None
+        self.error = None
+        self.done = _thread.allocate_lock()
+        self.done.acquire()
+
+    def contains(self, slave_addr, function_code, starting_addr, quantity):
+        return (self.slave_addr == slave_addr and self.function_code == function_code and
+                self.starting_addr <= starting_addr and
+                starting_addr + quantity <= self.starting_addr + self.quantity)
+
+    def wait(self):
+        # every follower passes the released lock on to the next one
+        self.done.acquire()
+        self.done.release()
+
+
+class uModBusSingleFlight:
+    def __init__(self, client):
+        self.client = client
+        self._lock = _thread.allocate_lock()
+        self._bus = _thread.allocate_lock()
+        self._flights = []
+        self.transactions = 0
+        self.shared = 0
+
+    def __getattr__(self, name):
+        # writes and everything else go straight to the client, one at a time
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        if name.startswith('iter_') or name.startswith('aiter_'):
+            # a generator would run its transactions after the lock is released
+            raise AttributeError('{} is not supported through uModBusSingleFlight'.format(name))
+
+        def locked(*args, **kwargs):
+            with self._bus:
+                return attr(*args, **kwargs)
+        return locked
+
+    def _to_signed(self, values, signed):
+        if not signed:
+            return values
+        return tuple(v - 0x10000 if v & 0x8000 else v for v in values)
+
+    def _read(self, function_code, slave_addr, starting_addr, quantity):
+        with self._lock:
+            for flight in self._flights:
+                if flight.contains(slave_addr, function_code, starting_addr, quantity):
+                    self.shared += 1
+                    leader = False
+                    break
+            else:
+                flight = uModBusFlight(slave_addr, function_code, starting_addr, quantity)
+                self._flights.append(flight)
+                leader = True
+
+        if leader:
+            try:
+                with self._bus:
+                    self.transactions += 1
+                    flight.result = self._transact(function_code, slave_addr, starting_addr, quantity)
+            except Exception as e:
+                flight.error = e
+            with self._lock:
+                self._flights.remove(flight)
+            flight.done.release()
+        else:
+            flight.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        offset = starting_addr - flight.starting_addr
+        return flight.result[offset:offset + quantity]
+
+    def _transact(self, function_code, slave_addr, starting_addr, quantity):
+        if function_code == Const.READ_COILS:
+            return self.client.read_coils(slave_addr, starting_addr, quantity)
+        elif function_code == Const.READ_DISCRETE_INPUTS:
+            return self.client.read_discrete_inputs(slave_addr, starting_addr, quantity)
+        elif function_code == Const.READ_HOLDING_REGISTERS:
+            return self.client.read_holding_registers(slave_addr, starting_addr, quantity, False)
+        return self.client.read_input_registers(slave_addr, starting_addr, quantity, False)
+
+    def read_coils(self, slave_addr, starting_addr, coil_qty):
+        return self._read(Const.READ_COILS, slave_addr, starting_addr, coil_qty)
+
+    def read_discrete_inputs(self, slave_addr, starting_addr, input_qty):
+        return self._read(Const.READ_DISCRETE_INPUTS, slave_addr, starting_addr, input_qty)
+
+    def read_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True):
+        values = self._read(Const.READ_HOLDING_REGISTERS, slave_addr, starting_addr, register_qty)
+        return self._to_signed(values, signed)
+
+    def read_input_registers(self, slave_addr, starting_address, register_quantity, signed=True):
+        values = self._read(Const.READ_INPUT_REGISTER, slave_addr, starting_address, register_quantity)
+        return self._to_signed(values, signed)
+
+    def _read_raw(self, read, *args):
+        # the client's view aliases its receive buffer, copy it before the bus is released
+        with self._bus:
+            self.transactions += 1
+            return bytes(read(*args))
+
+    def read_holding_registers_raw(self, slave_addr, starting_addr, register_qty):
+        return self._read_raw(self.client.read_holding_registers_raw, slave_addr, starting_addr, register_qty)
+
+    def read_input_registers_raw(self, slave_addr, starting_address, register_quantity):
+        return self._read_raw(self.client.read_input_registers_raw, slave_addr, starting_address, register_quantity)
+
+    def _iter_read(self, read, starting_addr, quantity, max_quantity, chunk_size, *args):
+        chunk_size = min(chunk_size or max_quantity, max_quantity)
+        for address, count in functions.chunk_span(starting_addr, quantity, chunk_size):
+            yield address, read(address, count, *args)
+
+    def iter_coils(self, slave_addr, starting_addr, coil_qty, chunk_size=None):
+        return self._iter_read(lambda address, count: self.read_coils(slave_addr, address, count),
+                               starting_addr, coil_qty, Const.MAX_READ_BITS, chunk_size)
+
+    def iter_discrete_inputs(self, slave_addr, starting_addr, input_qty, chunk_size=None):
+        return self._iter_read(lambda address, count: self.read_discrete_inputs(slave_addr, address, count),
+                               starting_addr, input_qty, Const.MAX_READ_BITS, chunk_size)
+
+    def iter_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, chunk_size=None):
+        return self._iter_read(lambda address, count: self.read_holding_registers(slave_addr, address, count, signed),
+                               starting_addr, register_qty, Const.MAX_READ_REGISTERS, chunk_size)
+
+    def iter_input_registers(self, slave_addr, starting_address, register_quantity, signed=True, chunk_size=None):
+        return self._iter_read(lambda address, count: self.read_input_registers(slave_addr, address, count, signed),
+                               starting_address, register_quantity, Const.MAX_READ_REGISTERS, chunk_size)
+
+    def aiter_coils(self, slave_addr, starting_addr, coil_qty, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_coils(slave_addr, starting_addr, coil_qty, chunk_size))
+
+    def aiter_discrete_inputs(self, slave_addr, starting_addr, input_qty, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_discrete_inputs(slave_addr, starting_addr, input_qty, chunk_size))
+
+    def aiter_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_holding_registers(slave_addr, starting_addr, register_qty,
+                                                              signed, chunk_size))
+
+    def aiter_input_registers(self, slave_addr, starting_address, register_quantity, signed=True, chunk_size=None):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_input_registers(slave_addr, starting_address, register_quantity,
+                                                            signed, chunk_size))
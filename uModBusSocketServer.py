@@ -18,11 +18,15 @@ class uModBusSocketServer(uModBusSequentialServer):
         self.connection_socket = None
         self._init_socket()
 
-    def _send_data(self, fx, data):
-        tcp_header = struct.pack('>HHHBB', self.current_packet_id, 0, len(data)+2, self.server_id, fx)
+    def _encode(self, fx, data):
+        # the MBAP header carries the transaction id, so only the PDU is reusable
+        return struct.pack('>B', fx) + data
+
+    def _send_frame(self, frame):
+        tcp_header = struct.pack('>HHHB', self.current_packet_id, 0, len(frame)+1, self.server_id)
         _logger.debug("Send Header: {}".format(tcp_header))
-        _logger.debug("Send Payload: {}".format(data))
-        self.connection_socket.send(tcp_header+data)
+        _logger.debug("Send Payload: {}".format(frame))
+        self.connection_socket.send(tcp_header+frame)
 
     def _send_error_response(self, fx, exception):
         response = struct.pack('>B', exception)
@@ -42,6 +46,7 @@ class uModBusSocketServer(uModBusSequentialServer):
         _logger.debug("Listening on: {}:{}".format(self.host, self.port))
         self.connection_socket, address = self.server_socket.accept()
         _logger.debug("Received connection from {}".format(address))
+        pending = b''
         while True:
             try:
                 _logger.debug("Waiting for message")
@@ -51,12 +56,20 @@ class uModBusSocketServer(uModBusSequentialServer):
             if buffer == b'':
                 break
             _logger.debug("Raw Input: {}".format(buffer))
-            if len(buffer) > 11:
-                self.current_packet_id, _protocol, length, server_id, fx = struct.unpack('>HHHBB', buffer[:8])
-                if server_id != self.server_id:
-                    return None
-                payload = buffer[8:8+length-2]
-                self.handleRequest(fx, payload)
+            pending += buffer
+            # a client may pipeline several requests into one segment
+            while len(pending) >= Const.MBAP_HDR_LENGTH - 1:
+                frame_length = Const.MBAP_HDR_LENGTH - 1 + struct.unpack('>H', pending[4:6])[0]
+                if len(pending) < frame_length:
+                    break
+                frame, pending = pending[:frame_length], pending[frame_length:]
+                if len(frame) > 9:
+                    self.current_packet_id, _protocol, length, server_id, fx = struct.unpack('>HHHBB', frame[:8])
+                    if server_id != self.server_id:
+                        return None
+                    payload = frame[8:8+length-2]
+                    if self._request_complete(fx, payload):
+                        self.handleRequest(fx, payload)
         return None
 
 
@@ -0,0 +1,25 @@
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+
+class uModBusAsyncChunks:
+    """ Async iterator over the (address, values) blocks of a client iter_* generator
+
+    Each transaction still blocks while it runs; the event loop gets control
+    back between two chunks.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
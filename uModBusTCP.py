@@ -4,6 +4,8 @@
 
 import uModBusFunctions as functions
 import uModBusConst as Const
+from uModBusRetry import uModBusUnitTracker
+from uModBusTime import ticks_ms, ticks_diff
 import struct
 import socket
 import random
@@ -11,13 +13,30 @@ import random
 
 class uModBusTCP:
 
-    def __init__(self, slave_ip, slave_port=502, timeout=5):
+    def __init__(self, slave_ip, slave_port=502, timeout=5, retries=2, tracker=None):
+        self._addr = socket.getaddrinfo(slave_ip, slave_port)[0][-1]
+        self._timeout = timeout
+        self._connect()
+        if tracker is None:
+            tracker = uModBusUnitTracker(initial_timeout_ms=int(timeout * 1000),
+                                         max_timeout_ms=int(timeout * 1000), retries=retries)
+        self.tracker = tracker
+        self._trans_id = random.randint(0, 65535)
+
+    def _connect(self):
         self._sock = socket.socket()
-        self._sock.connect(socket.getaddrinfo(slave_ip, slave_port)[0][-1])
-        self._sock.settimeout(timeout)
+        self._sock.connect(self._addr)
+        self._sock.settimeout(self._timeout)
+
+    def _reconnect(self):
+        # the rest of a partially received frame would otherwise be parsed as the next header
+        self._sock.close()
+        self._connect()
 
     def _create_mbap_hdr(self, slave_id, modbus_pdu):
-        trans_id = random.randint(0, 65535) & 0xFFFF
+        # sequential ids never collide between requests that are in flight together
+        self._trans_id = (self._trans_id + 1) & 0xFFFF
+        trans_id = self._trans_id
         mbap_hdr = struct.pack('>HHHB', trans_id, 0, len(modbus_pdu) + 1, slave_id)
 
         return mbap_hdr, trans_id
@@ -53,11 +72,45 @@ class uModBusTCP:
 
         return response[hdr_length:]
 
-    def _send_receive(self, slave_id, modbus_pdu, count):
+    def _recv_exact(self, size, partial=False):
+        """ Receive exactly size bytes
+        :param partial: Part of the frame has already been received
+        """
+        data = b''
+        try:
+            while len(data) < size:
+                chunk = self._sock.recv(size - len(data))
+                if not chunk:
+                    raise OSError('connection closed by slave')
+                data += chunk
+        except OSError:
+            if partial or data:
+                self._reconnect()
+            raise
+
+        return data
+
+    def _recv_frame(self):
+        mbap_hdr = self._recv_exact(Const.MBAP_HDR_LENGTH - 1)
+        length = struct.unpack('>H', mbap_hdr[4:6])[0]
+
+        return mbap_hdr + self._recv_exact(length, partial=True)
+
+    def _send_receive(self, slave_id, modbus_pdu, count, retries=None):
+        return self.tracker.transact(slave_id,
+                                     lambda timeout_ms: self._transaction(slave_id, modbus_pdu, count, timeout_ms),
+                                     retries)
+
+    def _transaction(self, slave_id, modbus_pdu, count, timeout_ms):
         mbap_hdr, trans_id = self._create_mbap_hdr(slave_id, modbus_pdu)
+        self._sock.settimeout(timeout_ms / 1000)
         self._sock.send(mbap_hdr + modbus_pdu)
 
-        response = self._sock.recv(256)
+        response = self._recv_frame()
+        # drop late replies to earlier attempts that already timed out
+        while struct.unpack('>H', response[:2])[0] != trans_id:
+            response = self._recv_frame()
+
         modbus_data = self._validate_resp_hdr(response, trans_id, slave_id, modbus_pdu[0], count)
 
         return modbus_data
@@ -94,6 +147,114 @@ class uModBusTCP:
 
         return register_value
 
+    def read_fifo_queue(self, slave_addr, fifo_pointer_address, signed=True):
+        """ Read up to 31 of the oldest queue entries, never retried as the slave removes what it sends
+        :returns: The entries, 31 of them mean more may be queued
+        """
+        modbus_pdu = functions.read_fifo_queue(fifo_pointer_address)
+
+        response = self._send_receive(slave_addr, modbus_pdu, False, retries=0)
+        byte_count, fifo_count = struct.unpack('>HH', response[:4])
+        if byte_count != 2 + fifo_count * 2 or len(response) < byte_count + 2:
+            raise ValueError('invalid FIFO queue response')
+
+        return self._to_short(response[4:4 + fifo_count * 2], signed)
+
+    def read_holding_registers_raw(self, slave_addr, starting_addr, register_qty):
+        modbus_pdu = functions.read_holding_registers(starting_addr, register_qty)
+
+        return self._send_receive(slave_addr, modbus_pdu, True)
+
+    def read_input_registers_raw(self, slave_addr, starting_address, register_quantity):
+        modbus_pdu = functions.read_input_registers(starting_address, register_quantity)
+
+        return self._send_receive(slave_addr, modbus_pdu, True)
+
+    def _recv_pipelined(self, trans_id, in_flight, received):
+        # responses to pipelined requests may come back in any order
+        response = received.pop(trans_id, None)
+        while response is None:
+            frame = self._recv_frame()
+            rec_tid = struct.unpack('>H', frame[:2])[0]
+            if rec_tid == trans_id:
+                response = frame
+            elif any(request[0] == rec_tid for request in in_flight):
+                received[rec_tid] = frame
+            # anything else is a late reply to an earlier, abandoned request
+
+        return response
+
+    def _iter_read(self, slave_addr, build_pdu, decode, starting_addr, quantity, max_quantity, chunk_size, window):
+        chunk_size = min(chunk_size or max_quantity, max_quantity)
+        chunks = functions.chunk_span(starting_addr, quantity, chunk_size)
+        if self.tracker.is_open(slave_addr):
+            raise OSError('slave {:d} skipped: too many consecutive failures'.format(slave_addr))
+        self._sock.settimeout(self.tracker.timeout_ms(slave_addr) / 1000)
+        # one stream at a time per connection: a second live stream would consume this one's replies
+        in_flight = []
+        received = {}
+        start = ticks_ms()
+        try:
+            for address, count in chunks:
+                modbus_pdu = build_pdu(address, count)
+                mbap_hdr, trans_id = self._create_mbap_hdr(slave_addr, modbus_pdu)
+                self._sock.send(mbap_hdr + modbus_pdu)
+                in_flight.append((trans_id, address, count, modbus_pdu[0]))
+                if len(in_flight) >= window:
+                    yield self._pipelined_result(slave_addr, decode, in_flight, received)
+            while in_flight:
+                yield self._pipelined_result(slave_addr, decode, in_flight, received)
+        except OSError:
+            self.tracker.failure(slave_addr)
+            raise
+        self.tracker.success(slave_addr, ticks_diff(ticks_ms(), start), sample=False)
+
+    def _pipelined_result(self, slave_addr, decode, in_flight, received):
+        trans_id, address, count, function_code = in_flight.pop(0)
+        response = self._recv_pipelined(trans_id, in_flight, received)
+        data = self._validate_resp_hdr(response, trans_id, slave_addr, function_code, True)
+
+        return address, decode(data, count)
+
+    def iter_coils(self, slave_addr, starting_addr, coil_qty, chunk_size=None, window=4):
+        return self._iter_read(slave_addr, functions.read_coils, lambda data, count: self._bytes_to_bool(data)[:count],
+                               starting_addr, coil_qty, Const.MAX_READ_BITS, chunk_size, window)
+
+    def iter_discrete_inputs(self, slave_addr, starting_addr, input_qty, chunk_size=None, window=4):
+        return self._iter_read(slave_addr, functions.read_discrete_inputs,
+                               lambda data, count: self._bytes_to_bool(data)[:count],
+                               starting_addr, input_qty, Const.MAX_READ_BITS, chunk_size, window)
+
+    def iter_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, chunk_size=None, window=4):
+        return self._iter_read(slave_addr, functions.read_holding_registers,
+                               lambda data, count: self._to_short(data, signed),
+                               starting_addr, register_qty, Const.MAX_READ_REGISTERS, chunk_size, window)
+
+    def iter_input_registers(self, slave_addr, starting_address, register_quantity, signed=True, chunk_size=None,
+                             window=4):
+        return self._iter_read(slave_addr, functions.read_input_registers,
+                               lambda data, count: self._to_short(data, signed),
+                               starting_address, register_quantity, Const.MAX_READ_REGISTERS, chunk_size, window)
+
+    def aiter_coils(self, slave_addr, starting_addr, coil_qty, chunk_size=None, window=4):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_coils(slave_addr, starting_addr, coil_qty, chunk_size, window))
+
+    def aiter_discrete_inputs(self, slave_addr, starting_addr, input_qty, chunk_size=None, window=4):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_discrete_inputs(slave_addr, starting_addr, input_qty, chunk_size, window))
+
+    def aiter_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, chunk_size=None, window=4):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_holding_registers(slave_addr, starting_addr, register_qty,
+                                                              signed, chunk_size, window))
+
+    def aiter_input_registers(self, slave_addr, starting_address, register_quantity, signed=True, chunk_size=None,
+                              window=4):
+        from uModBusStream import uModBusAsyncChunks
+        return uModBusAsyncChunks(self.iter_input_registers(slave_addr, starting_address, register_quantity,
+                                                            signed, chunk_size, window))
+
     def write_single_coil(self, slave_addr, output_address, output_value):
         modbus_pdu = functions.write_single_coil(output_address, output_value)
 
@@ -0,0 +1,30 @@
+# Tick helpers that use the MicroPython time API when available and fall
+# back to equivalent CPython implementations so the same code runs on a host.
+
+import time
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms, sleep_us
+except ImportError:
+    _TICKS_PERIOD = 1 << 30
+    _TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000) & (_TICKS_PERIOD - 1)
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000) & (_TICKS_PERIOD - 1)
+
+    def ticks_diff(end, start):
+        return ((end - start + _TICKS_HALFPERIOD) & (_TICKS_PERIOD - 1)) - _TICKS_HALFPERIOD
+
+    def ticks_add(ticks, delta):
+        return (ticks + delta) & (_TICKS_PERIOD - 1)
+
+    def sleep_ms(ms):
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def sleep_us(us):
+        if us > 0:
+            time.sleep(us / 1000000)
@@ -0,0 +1,237 @@
+###
+# Byte transports used by uModBusSerial and uModBusSerialServer. Reads go
+# through readinto() so callers can reuse one receive buffer per instance.
+# Only uModBusUARTTransport and uModBusPipeTransport are available on
+# MicroPython; the other transports need a CPython host.
+###
+
+from uModBusExceptions import NotImplementedException
+
+
+class uModBusTransport:
+    def any(self):
+        """ Number of bytes that can be read without blocking """
+        raise NotImplementedException("Transport bytes available")
+
+    def readinto(self, buf):
+        """ Read available bytes into buf
+        :param buf: A writable buffer, usually a memoryview slice of the receive buffer
+        :returns: The number of bytes read, 0 if nothing was available
+        """
+        raise NotImplementedException("Transport read")
+
+    def write(self, data):
+        raise NotImplementedException("Transport write")
+
+    def reset_input(self):
+        """ Discard anything left in the receive queue """
+        raise NotImplementedException("Transport input reset")
+
+    def deinit(self):
+        pass
+
+
+class uModBusUARTTransport(uModBusTransport):
+    """ machine.UART, pyb.UART or any class with the same interface """
+
+    def __init__(self, uart):
+        self.uart = uart
+        if hasattr(uart, 'txdone'):
+            self.txdone = uart.txdone
+        self._readinto = getattr(uart, 'readinto', None)
+
+    def any(self):
+        return self.uart.any()
+
+    def readinto(self, buf):
+        # only ask for what is already buffered so the UART read timeout never applies
+        nbytes = min(len(buf), self.uart.any())
+        if nbytes == 0:
+            return 0
+        if self._readinto is None:
+            data = self.uart.read(nbytes)
+            if not data:
+                return 0
+            buf[:len(data)] = data
+            return len(data)
+        return self._readinto(buf, nbytes) or 0
+
+    def write(self, data):
+        return self.uart.write(data)
+
+    def reset_input(self):
+        while self.uart.any():
+            self.uart.read()
+
+    def deinit(self):
+        self.uart.deinit()
+
+
+class uModBusPipeTransport(uModBusTransport):
+    """ In-memory endpoint, create connected endpoints with pair() """
+
+    def __init__(self):
+        self.rx = bytearray()
+        self.peer = None
+
+    @classmethod
+    def pair(cls):
+        a = cls()
+        b = cls()
+        a.peer = b
+        b.peer = a
+        return a, b
+
+    def any(self):
+        return len(self.rx)
+
+    def readinto(self, buf):
+        count = min(len(buf), len(self.rx))
+        buf[:count] = self.rx[:count]
+        del self.rx[:count]
+        return count
+
+    def write(self, data):
+        self.peer.rx.extend(data)
+        return len(data)
+
+    def txdone(self):
+        return True
+
+    def reset_input(self):
+        del self.rx[:]
+
+
+class uModBusFdTransport(uModBusTransport):
+    """ Non-blocking POSIX file descriptor, e.g. a tty or the master side of a pty """
+
+    def __init__(self, fd):
+        import fcntl
+        import os
+        import sys
+        import termios
+        self.fd = fd
+        self._byteorder = sys.byteorder
+        self._fcntl = fcntl
+        self._os = os
+        self._termios = termios
+        self._fionread = bytearray(4)
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def any(self):
+        self._fcntl.ioctl(self.fd, self._termios.FIONREAD, self._fionread, True)
+        return int.from_bytes(self._fionread, self._byteorder)
+
+    def readinto(self, buf):
+        try:
+            return self._os.readv(self.fd, [buf])
+        except BlockingIOError:
+            return 0
+
+    def write(self, data):
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            try:
+                written += self._os.write(self.fd, view[written:])
+            except BlockingIOError:
+                self.txdone()
+        return written
+
+    def txdone(self):
+        try:
+            self._termios.tcdrain(self.fd)
+        except self._termios.error:
+            # the master side of a pty has no transmitter to wait for
+            pass
+        return True
+
+    def reset_input(self):
+        try:
+            self._termios.tcflush(self.fd, self._termios.TCIFLUSH)
+        except self._termios.error:
+            while self.any():
+                self.readinto(bytearray(self.any()))
+
+    def deinit(self):
+        if self.fd is not None:
+            self._os.close(self.fd)
+            self.fd = None
+
+
+class uModBusTermiosTransport(uModBusFdTransport):
+    """ A tty device configured in raw mode through termios """
+
+    def __init__(self, port, baudrate=9600, data_bits=8, parity=None, stop_bits=1):
+        import os
+        super().__init__(os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK))
+        self.configure(baudrate, data_bits, parity, stop_bits)
+
+    def configure(self, baudrate=9600, data_bits=8, parity=None, stop_bits=1):
+        termios = self._termios
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(self.fd)
+        iflag = 0
+        oflag = 0
+        lflag = 0
+        cflag &= ~(termios.CSIZE | termios.PARENB | termios.PARODD | termios.CSTOPB)
+        cflag |= termios.CLOCAL | termios.CREAD
+        cflag |= {5: termios.CS5, 6: termios.CS6, 7: termios.CS7, 8: termios.CS8}[data_bits]
+        if parity is not None:
+            # same convention as machine.UART: 0 is even, 1 is odd
+            cflag |= termios.PARENB | (termios.PARODD if parity else 0)
+        if stop_bits == 2:
+            cflag |= termios.CSTOPB
+        speed = getattr(termios, 'B{}'.format(baudrate))
+        cc[termios.VMIN] = 0
+        cc[termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc])
+
+
+class uModBusPtyTransport(uModBusFdTransport):
+    """ The master side of a new pseudo terminal, peer_name is the tty to open on the other end """
+
+    def __init__(self):
+        import os
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        self.peer_name = os.ttyname(slave)
+        self._slave = slave
+        super().__init__(master)
+
+    def peer(self):
+        return uModBusFdTransport(self._slave)
+
+
+class uModBusPySerialTransport(uModBusTransport):
+    """ A pyserial serial.Serial instance """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.serial.timeout = 0
+
+    def any(self):
+        return self.serial.in_waiting
+
+    def readinto(self, buf):
+        return self.serial.readinto(buf) or 0
+
+    def write(self, data):
+        return self.serial.write(data)
+
+    def txdone(self):
+        self.serial.flush()
+        return True
+
+    def reset_input(self):
+        self.serial.reset_input_buffer()
+
+    def deinit(self):
+        self.serial.close()
+
+
+def as_transport(uart):
+    if isinstance(uart, uModBusTransport):
+        return uart
+    return uModBusUARTTransport(uart)
@@ -0,0 +1,129 @@
+import uModBusConst as Const
+from uModBusTime import ticks_ms, ticks_diff
+
+###
+# Single coil and register writes are queued in order and merged into
+# WRITE_MULTIPLE_COILS / WRITE_MULTIPLE_REGISTERS requests while they extend
+# the slave's latest run of adjacent addresses. Writes leave in the order they
+# were queued: a write that does not extend the run (another function, a gap,
+# or an address already pending) starts a new run, so every queued value is
+# sent. Once a transaction to a slave fails, its later runs are not sent.
+###
+
+
+class uModBusPendingWrite:
+    def __init__(self, slave_addr, address, value):
+        self.slave_addr = slave_addr
+        self.address = address
+        self.value = value
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def __str__(self):
+        return "PendingWrite({}:{}={}, done={}, result={})".format(self.slave_addr, self.address, self.value,
+                                                                    self.done, self.result)
+
+
+class uModBusWriteBuffer:
+    def __init__(self, client, window_ms=50):
+        """ Initialize the write buffer
+        :param client: A uModBusSerial or uModBusTCP instance
+        :param window_ms: How long the first queued write may wait before poll() flushes, None for explicit flush only
+        """
+        self.client = client
+        self.window_ms = window_ms
+        self.transactions = 0
+        self._runs = []
+        self._latest = {}
+        self._handles = []
+        self._first_ms = None
+
+    def write_single_coil(self, slave_addr, output_address, output_value):
+        if output_value not in [0x0000, 0xFF00, False, True]:
+            raise ValueError('Illegal coil value')
+
+        return self._queue('c', slave_addr, output_address, bool(output_value))
+
+    def write_single_register(self, slave_addr, register_address, register_value, signed=True):
+        low, high = (-0x8000, 0x7FFF) if signed else (0x0000, 0xFFFF)
+        if not (low <= register_value <= high):
+            raise ValueError('Illegal register value')
+
+        return self._queue('h', slave_addr, register_address, register_value & 0xFFFF)
+
+    def _queue(self, kind, slave_addr, address, value):
+        handle = uModBusPendingWrite(slave_addr, address, value)
+        run = self._latest.get(slave_addr)
+        limit = Const.MAX_WRITE_COILS if kind == 'c' else Const.MAX_WRITE_REGISTERS
+        if run is not None and run[1] == kind and address == run[2] + len(run[3]) and len(run[3]) < limit:
+            run[3].append(value)
+            run[4].append(handle)
+        else:
+            run = [slave_addr, kind, address, [value], [handle]]
+            self._runs.append(run)
+            self._latest[slave_addr] = run
+        self._handles.append(handle)
+        if self._first_ms is None:
+            self._first_ms = ticks_ms()
+        self.poll()
+        return handle
+
+    def pending(self):
+        return len(self._handles)
+
+    def poll(self):
+        """ Flush if the oldest queued write has waited for window_ms """
+        if (self._first_ms is not None and self.window_ms is not None and
+                ticks_diff(ticks_ms(), self._first_ms) >= self.window_ms):
+            return self.flush()
+        return []
+
+    def flush(self):
+        """ Send all queued writes in the order they were queued
+        :returns: The handles of the flushed writes in the order they were queued
+        """
+        runs = self._runs
+        handles = self._handles
+        self._runs = []
+        self._latest = {}
+        self._handles = []
+        self._first_ms = None
+
+        failed = {}
+        for slave_addr, kind, start, values, run_handles in runs:
+            if slave_addr in failed:
+                self._fail(run_handles, failed[slave_addr])
+                continue
+            error = self._send(kind, slave_addr, start, values, run_handles)
+            if error is not None:
+                failed[slave_addr] = error
+
+        return handles
+
+    def _fail(self, handles, error):
+        for handle in handles:
+            handle.done = True
+            handle.result = False
+            handle.error = error
+
+    def _send(self, kind, slave_addr, start, values, handles):
+        self.transactions += 1
+        try:
+            if kind == 'c':
+                if len(values) == 1:
+                    result = self.client.write_single_coil(slave_addr, start, 0xFF00 if values[0] else 0x0000)
+                else:
+                    result = self.client.write_multiple_coils(slave_addr, start, values)
+            else:
+                if len(values) == 1:
+                    result = self.client.write_single_register(slave_addr, start, values[0], False)
+                else:
+                    result = self.client.write_multiple_registers(slave_addr, start, values, False)
+        except Exception as e:
+            self._fail(handles, e)
+            return e
+        for handle in handles:
+            handle.done = True
+            handle.result = result
+        return None